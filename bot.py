@@ -1,8 +1,10 @@
 import re
 import logging
 import os
-import asyncio
-from typing import Tuple, List, Dict
+import string
+from functools import lru_cache
+from typing import Tuple, List, Dict, Callable, NamedTuple
+import ahocorasick
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, filters, 
@@ -16,12 +18,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Enhanced grammar rules with categories
+# Closed verb sets: wrong form -> corrected form
+_BASE_FORM = {'goes': 'go', 'eats': 'eat', 'plays': 'play', 'reads': 'read', 'writes': 'write'}
+_ING_FORM = {'go': 'going', 'eat': 'eating', 'play': 'playing'}
+
+def _with_forms(prefix: str, forms: Dict[str, str]) -> Dict:
+    """Pattern matching prefix + a word from forms, plus the forms table.
+    
+    The word group is appended last and built from the table's keys, so
+    every word it can match has an entry in forms.
+    """
+    return {
+        'pattern': rf"{prefix}({'|'.join(map(re.escape, forms))})\b",
+        'forms': forms,
+    }
+
+# Enhanced grammar rules with categories.
+# Rules with 'forms' look up their last captured word in that table and
+# append the result to the expanded correction. 'anchors' lists lowercase
+# literals of which every match of the rule contains at least one.
 GRAMMAR_RULES = [
     {
         'category': 'Subject-Verb Agreement',
-        'pattern': r'\bI (goes|eats|plays|reads|writes)\b',
-        'correction': 'I go',
+        **_with_forms(r'\bI ', _BASE_FORM),
+        'correction': 'I ',
+        'anchors': ('i ',),
         'explanation': '🚫 "I" always takes base form verb! ✅ Use "I go" 🌟',
         'examples': ['❌ I goes to school', '✅ I go to school']
     },
@@ -29,13 +50,15 @@ GRAMMAR_RULES = [
         'category': 'Subject-Verb Agreement',
         'pattern': r'\b(He|She|It) (go|eat|play|read|write)\b',
         'correction': r'\1 \2s',
+        'anchors': ('he ', 'she ', 'it '),
         'explanation': '🐰 He/She/It requires verb + "s"! 🎯',
         'examples': ['❌ He play football', '✅ He plays football']
     },
     {
         'category': 'Tense Consistency',
-        'pattern': r'\b(I am|You are|He is|She is|It is|We are|They are) (go|eat|play)\b',
-        'correction': r'\1 \2ing',
+        **_with_forms(r'\b(I am|You are|He is|She is|It is|We are|They are) ', _ING_FORM),
+        'correction': r'\1 ',
+        'anchors': ('am ', 'are ', 'is '),
         'explanation': '📥 Present continuous requires verb + "ing"! 🌈',
         'examples': ['❌ I am go to school', '✅ I am going to school']
     },
@@ -43,6 +66,7 @@ GRAMMAR_RULES = [
         'category': 'Verb Forms',
         'pattern': r'\b(I|You|We|They) (was)\b',
         'correction': r'\1 were',
+        'anchors': ('was',),
         'explanation': '🦊 I/You/We/They use "were" in past tense! 🎀',
         'examples': ['❌ They was happy', '✅ They were happy']
     },
@@ -50,48 +74,163 @@ GRAMMAR_RULES = [
         'category': 'Auxiliary Verbs',
         'pattern': r'\bdo (he|she|it)\b',
         'correction': r'does \1',
+        'anchors': ('do ',),
         'explanation': '🤪 He/She/It uses "does" as auxiliary! 🥳',
         'examples': ['❌ Do she like music?', '✅ Does she like music?']
     }
 ]
 
+def _validate_rules(rules: List[Dict]) -> List[Dict]:
+    """Drop malformed rules once at startup.
+    
+    The pattern must compile. The correction may only use \\N backrefs,
+    each naming one of the pattern's own groups; \\g<...> and other
+    escapes are not supported. The rule must list lowercase anchors for
+    the prefilter.
+    """
+    valid = []
+    for rule in rules:
+        try:
+            compiled = re.compile(rule['pattern'])
+        except re.error as e:
+            logger.error("Rule error: %s", e)
+            continue
+        if '\\' in re.sub(r'\\\d+', '', rule['correction']):
+            logger.error("Rule error: unsupported escape in %r", rule['correction'])
+            continue
+        refs = [int(n) for n in re.findall(r'\\(\d+)', rule['correction'])]
+        bad_refs = [n for n in refs if not 1 <= n <= compiled.groups]
+        if bad_refs:
+            logger.error("Rule error: invalid group reference %s in %r", bad_refs[0], rule['correction'])
+            continue
+        anchors = rule.get('anchors')
+        if not anchors or any(anchor != anchor.lower() for anchor in anchors):
+            logger.error("Rule error: missing or non-lowercase anchors for %r", rule['pattern'])
+            continue
+        valid.append(rule)
+    return valid
+
+def _make_form_lookup(forms: Dict[str, str]) -> Callable[[str], str]:
+    """Map a matched word to its corrected form.
+    
+    (?i) also matches letters like 'ſ' or 'ı' that str.lower() does not fold
+    to ASCII, so when the fast dict lookup misses, fall back to matching the
+    word against each key the same way the rule pattern does.
+    """
+    keys = [(re.compile(re.escape(key), re.IGNORECASE), form) for key, form in forms.items()]
+    
+    def lookup(word: str) -> str:
+        form = forms.get(word.lower())
+        if form is None:
+            form = next(form for key, form in keys if key.fullmatch(word))
+        return form
+    
+    return lookup
+
+def _make_replacer(rule: Dict, offset: int, last: int) -> Callable:
+    """Turn a rule's correction into a callable that builds the replacement.
+    
+    The \\1-style template is parsed once into a str.format string, so no
+    template parsing happens per match. Backrefs are relative to the rule,
+    so they are shifted by its group offset in the combined pattern;
+    _validate_rules has already checked that they are in range.
+    """
+    groups = []
+    
+    def to_field(m: re.Match) -> str:
+        groups.append(int(m.group(1)) + offset)
+        return f'{{{len(groups) - 1}}}'
+    
+    escaped = rule['correction'].replace('{', '{{').replace('}', '}}')
+    fmt = re.sub(r'\\(\d+)', to_field, escaped)
+    
+    if 'forms' in rule:
+        lookup = _make_form_lookup(rule['forms'])
+        return lambda m: (
+            fmt.format(*[m.group(g) or '' for g in groups]) + lookup(m.group(last))
+        )
+    return lambda m: fmt.format(*[m.group(g) or '' for g in groups])
+
+def _build_combined(rules: List[Dict]) -> Tuple[re.Pattern, List[Callable]]:
+    """Merge all rule patterns into one alternation with a named group per rule"""
+    combined = re.compile(
+        '(?i)' + '|'.join(f"(?P<r{i}>{rule['pattern']})" for i, rule in enumerate(rules))
+    )
+    replacers = []
+    for i, rule in enumerate(rules):
+        offset = combined.groupindex[f'r{i}']
+        last = offset + re.compile(rule['pattern']).groups
+        replacers.append(_make_replacer(rule, offset, last))
+    return combined, replacers
+
+class FrozenCorrection(NamedTuple):
+    """Immutable correction details, safe to share between cached results"""
+    category: str
+    explanation: str
+    examples: Tuple[str, ...]
+
+_RULES = _validate_rules(GRAMMAR_RULES)
+_COMBINED_RE, _REPLACERS = _build_combined(_RULES)
+_FROZEN_CORRECTIONS = [
+    FrozenCorrection(rule['category'], rule['explanation'], tuple(rule['examples']))
+    for rule in _RULES
+]
+
+@lru_cache(maxsize=4096)
+def _check_grammar_cached(text: str) -> Tuple[str, Tuple[FrozenCorrection, ...]]:
+    """Correct text in one pass; memoized since users often resend the same phrase"""
+    fired = set()
+    
+    def apply_rule(match: re.Match) -> str:
+        index = int(match.lastgroup[1:])
+        replacement = _REPLACERS[index](match)
+        if replacement != match.group():
+            fired.add(index)
+        return replacement
+    
+    text = _COMBINED_RE.sub(apply_rule, text)
+    return text, tuple(_FROZEN_CORRECTIONS[index] for index in sorted(fired))
+
 class GrammarChecker:
     def __init__(self):
-        self.rules = GRAMMAR_RULES
+        self.rules = _RULES
     
     def check_grammar(self, text: str) -> Tuple[str, List[Dict]]:
         """Check and correct grammar with detailed feedback"""
-        original_text = text
-        corrections = []
-        
-        for rule in self.rules:
-            try:
-                if re.search(rule['pattern'], text, re.IGNORECASE):
-                    corrected = re.sub(
-                        rule['pattern'], 
-                        rule['correction'], 
-                        text, 
-                        flags=re.IGNORECASE
-                    )
-                    if corrected != text:
-                        text = corrected
-                        corrections.append({
-                            'category': rule['category'],
-                            'explanation': rule['explanation'],
-                            'examples': rule['examples']
-                        })
-            except Exception as e:
-                logger.error(f"Rule error: {e}")
-                continue
-        
-        return text, corrections
+        text, corrections = _check_grammar_cached(text)
+        return text, [
+            {
+                'category': correction.category,
+                'explanation': correction.explanation,
+                'examples': list(correction.examples)
+            }
+            for correction in corrections
+        ]
 
 # Initialize grammar checker
 grammar_checker = GrammarChecker()
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Send welcome message with keyboard"""
-    welcome_text = """
+# Shortest text any rule can match ("I was", "It go", "do he");
+# longer messages than the max are not checked at all
+_MIN_CHECK_LENGTH = 5
+_MAX_CHECK_LENGTH = 2000
+
+# Every rule's anchors; messages containing none of them skip the regex pass
+_ANCHOR_AC = ahocorasick.Automaton()
+for anchor in {anchor for rule in _RULES for anchor in rule['anchors']}:
+    _ANCHOR_AC.add_word(anchor, anchor)
+_ANCHOR_AC.make_automaton()
+
+def _has_anchor(text: str) -> bool:
+    """Cheap prefilter: could any grammar rule match this text?"""
+    # str.lower() folds case the same way (?i) does only for ASCII text;
+    # letters like 'İ' match 'I' in the rules but do not lower to 'i'
+    if not text.isascii():
+        return True
+    return next(_ANCHOR_AC.iter(text.lower()), None) is not None
+
+# Static replies are rendered once at import
+_WELCOME_TEXT = """
 🎓 **Smart Grammar Checker Bot** 🤖
 
 I'll help you improve your English grammar instantly! 📚✨
@@ -114,15 +253,8 @@ I'll help you improve your English grammar instantly! 📚✨
 
 Ready to improve your English? Send me a sentence! 🚀
 """
-    
-    keyboard = [["Check Grammar", "View Rules"], ["Help", "About"]]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    
-    await update.message.reply_text(welcome_text, reply_markup=reply_markup)
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show help information"""
-    help_text = """
+_HELP_TEXT = """
 🆘 **Help Guide**
 
 **Commands:**
@@ -141,24 +273,82 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 **Tip:** Practice regularly to improve your grammar skills! 💪
 """
-    await update.message.reply_text(help_text)
 
-async def show_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Display all grammar rules"""
-    rules_text = "📚 **Grammar Rules Collection**\n\n"
+_STATS_TEXT = """
+📊 **Grammar Statistics** (Coming Soon!)
+
+Future features:
+• Error tracking over time
+• Most common mistakes
+• Progress reports
+• Personalized learning tips
+
+Stay tuned for updates! 🚀
+"""
+
+_ABOUT_TEXT = "🤖 Advanced Grammar Checker\nVersion 2.0\nBuilt with Python"
+
+def _render_rules() -> str:
+    """Build the grammar rules overview shown by /rules"""
+    parts = ["📚 **Grammar Rules Collection**\n\n"]
     
     current_category = ""
     for rule in GRAMMAR_RULES:
         if rule['category'] != current_category:
             current_category = rule['category']
-            rules_text += f"\n🔹 **{current_category}**\n"
+            parts.append(f"\n🔹 **{current_category}**\n")
         
-        rules_text += f"📖 {rule['explanation']}\n"
+        parts.append(f"📖 {rule['explanation']}\n")
         for example in rule['examples']:
-            rules_text += f"   {example}\n"
-        rules_text += "\n"
+            parts.append(f"   {example}\n")
+        parts.append("\n")
     
-    await update.message.reply_text(rules_text)
+    return "".join(parts)
+
+_RULES_TEXT = _render_rules()
+
+# Grammar analysis reply pieces
+_ANALYSIS_HEADER = "🔍 **Grammar Analysis**\n\n"
+_CORRECTIONS_HEADER = "📖 **Corrections Made:**\n"
+_CORRECTION_TEMPLATE = "\n{i}. **{category}**\n   💡 {explanation}\n   {examples}\n"
+_ANALYSIS_FOOTER = "\n🎉 **Perfect!** {n} error(s) fixed! 🌈"
+_PERFECT_TEMPLATE = "✅ **Perfect Grammar!**\n\n`{text}`\n\n🌟 Excellent! No grammar errors found! 🎯"
+
+_REPLY_MARKUP = ReplyKeyboardMarkup(
+    [["Check Grammar", "View Rules"], ["Help", "About"]],
+    resize_keyboard=True
+)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send welcome message with keyboard"""
+    await update.message.reply_text(_WELCOME_TEXT, reply_markup=_REPLY_MARKUP)
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show help information"""
+    await update.message.reply_text(_HELP_TEXT)
+
+async def show_rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Display all grammar rules"""
+    await update.message.reply_text(_RULES_TEXT)
+
+async def _send_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ask the user for a sentence to check"""
+    await update.message.reply_text("📝 Send me a sentence to check!")
+
+async def _send_about(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show bot version information"""
+    await update.message.reply_text(_ABOUT_TEXT)
+
+# Any English letter; used to reject non-English messages
+_ASCII_ALPHA = frozenset(string.ascii_letters)
+
+# Keyboard button text -> handler
+BUTTON_HANDLERS = {
+    "Check Grammar": _send_prompt,
+    "View Rules": show_rules,
+    "Help": help_command,
+    "About": _send_about,
+}
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming messages"""
@@ -166,69 +356,59 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_text = update.message.text
         
         # Handle keyboard buttons
-        if user_text == "Check Grammar":
-            await update.message.reply_text("📝 Send me a sentence to check!")
-            return
-        elif user_text == "View Rules":
-            await show_rules(update, context)
-            return
-        elif user_text == "Help":
-            await help_command(update, context)
-            return
-        elif user_text == "About":
-            await update.message.reply_text("🤖 Advanced Grammar Checker\nVersion 2.0\nBuilt with Python")
+        button_handler = BUTTON_HANDLERS.get(user_text)
+        if button_handler:
+            await button_handler(update, context)
             return
         
         # Check if text contains English characters
-        if not any(c.isalpha() and ord(c) < 128 for c in user_text):
+        if _ASCII_ALPHA.isdisjoint(user_text):
             await update.message.reply_text("🌍 Please send text in English for grammar checking!")
             return
         
+        if len(user_text) > _MAX_CHECK_LENGTH:
+            await update.message.reply_text(
+                f"✂️ Your message is too long to check! Please send at most {_MAX_CHECK_LENGTH} characters."
+            )
+            return
+        
         # Process grammar check
-        corrected_text, corrections = grammar_checker.check_grammar(user_text)
+        if len(user_text) >= _MIN_CHECK_LENGTH and _has_anchor(user_text):
+            corrected_text, corrections = grammar_checker.check_grammar(user_text)
+        else:
+            corrected_text, corrections = user_text, []
         
         if corrected_text != user_text and corrections:
             # Build detailed response
-            response = f"🔍 **Grammar Analysis**\n\n"
-            response += f"✗ **Original:** `{user_text}`\n"
-            response += f"✅ **Corrected:** `{corrected_text}`\n\n"
-            
-            response += "📖 **Corrections Made:**\n"
-            for i, correction in enumerate(corrections, 1):
-                response += f"\n{i}. **{correction['category']}**\n"
-                response += f"   💡 {correction['explanation']}\n"
-                for example in correction['examples']:
-                    response += f"   {example}\n"
-            
-            response += f"\n🎉 **Perfect!** {len(corrections)} error(s) fixed! 🌈"
-            
+            response = "".join([
+                _ANALYSIS_HEADER,
+                f"✗ **Original:** `{user_text}`\n✅ **Corrected:** `{corrected_text}`\n\n",
+                _CORRECTIONS_HEADER,
+                *(
+                    _CORRECTION_TEMPLATE.format(
+                        i=i,
+                        category=correction['category'],
+                        explanation=correction['explanation'],
+                        examples="\n   ".join(correction['examples'])
+                    )
+                    for i, correction in enumerate(corrections, 1)
+                ),
+                _ANALYSIS_FOOTER.format(n=len(corrections)),
+            ])
         else:
-            response = f"✅ **Perfect Grammar!**\n\n"
-            response += f"`{user_text}`\n\n"
-            response += "🌟 Excellent! No grammar errors found! 🎯"
+            response = _PERFECT_TEMPLATE.format(text=user_text)
         
         await update.message.reply_text(response)
         
     except Exception as e:
-        logger.error(f"Error in handle_message: {e}")
+        logger.error("Error in handle_message: %s", e)
         await update.message.reply_text("❌ Sorry, I encountered an error. Please try again!")
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user statistics"""
-    stats_text = """
-📊 **Grammar Statistics** (Coming Soon!)
-
-Future features:
-• Error tracking over time
-• Most common mistakes
-• Progress reports
-• Personalized learning tips
-
-Stay tuned for updates! 🚀
-"""
-    await update.message.reply_text(stats_text)
+    await update.message.reply_text(_STATS_TEXT)
 
-async def main():
+def main():
     """Start the bot"""
     print("🎓 Advanced Grammar Bot Starting...")
     print("=" * 40)
@@ -260,11 +440,11 @@ async def main():
         print("💬 Bot is now live 24/7! 🚀")
         
         # Start polling
-        await application.run_polling()
+        application.run_polling()
         
     except Exception as e:
         print(f"❌ Error: {e}")
         print("🔧 Please check your Bot Token!")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
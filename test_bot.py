@@ -0,0 +1,44 @@
+import bot
+
+
+def check(text):
+    return bot.grammar_checker.check_grammar(text)
+
+
+def test_corrects_base_verb_after_i():
+    assert check("I eats rice")[0] == "I eat rice"
+
+
+def test_corrects_present_continuous():
+    assert check("They are eat")[0] == "They are eating"
+
+
+def test_forms_lookup_accepts_unicode_case_variants():
+    # (?i) matches 'ſ' as 's' and 'ı' as 'i', but str.lower() keeps them
+    assert check("I goeſ to school")[0] == "I go to school"
+    assert check("I wrıtes letters")[0] == "I write letters"
+
+
+def test_prefilter_skips_text_without_anchors():
+    assert not bot._has_anchor("Hello there friend")
+    assert bot._has_anchor("They was happy")
+
+
+def test_prefilter_passes_text_the_rules_can_match():
+    # 'İ' matches 'I' under (?i) but lowers to 'i̇', so it must not be skipped
+    assert bot._has_anchor("İ goes")
+    assert check("İ goes")[0] == "I go"
+
+
+def test_rule_without_anchors_is_dropped():
+    rule = dict(bot.GRAMMAR_RULES[0])
+    del rule['anchors']
+    assert bot._validate_rules([rule]) == []
+
+
+def test_corrections_only_support_numbered_backrefs():
+    base = {'category': 'c', 'explanation': 'e', 'examples': [], 'anchors': ('was',)}
+    valid = dict(base, pattern=r'\b(They) (was)\b', correction=r'\1 were')
+    assert bot._validate_rules([valid]) == [valid]
+    for correction in (r'\g<1> were', r'\1 were\n', r'\1 \3 were', r'\0 were'):
+        assert bot._validate_rules([dict(valid, correction=correction)]) == []